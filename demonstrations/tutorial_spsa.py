@@ -25,7 +25,7 @@ quantum circuit without having to compute it exactly.
 This demonstration shows how the SPSA optimizer performs on the following tasks,
 compared to a gradient descent optimization:
 
-1. A simple task on a sampling device,
+1. A simple task on a state-vector simulator,
 2. The variational quantum eigensolver on a simulated hardware device.
 
 Throughout the demo, we show results obtained with SPSA and with gradient
@@ -136,28 +136,30 @@ the function, compared to a standard gradient-based optimizer.
 
 Now that we have explored how SPSA works, let's see how it performs in practice!
 
-Optimization on a sampling device
----------------------------------
+Optimization of a simple circuit
+--------------------------------
 
-First, let's consider a simple quantum circuit on a sampling device. For this,
-we'll be using a device from the `PennyLane-Qiskit plugin
-<https://pennylaneqiskit.readthedocs.io/en/latest/>`_ that samples quantum
-circuits to get measurement outcomes and later post-processes these outcomes to
-compute statistics like expectation values.
+First, let's consider a simple quantum circuit. Device noise is not the point
+of this first experiment, so we compute exact expectation values with the
+``lightning.qubit`` state-vector simulator. The expectation value of a tensor
+product of Pauli operators is then obtained directly from the state vector,
+which is much faster than sampling the circuit many times and post-processing
+the measurement outcomes. SPSA nevertheless remains a stochastic method, as the
+gradient estimates are based on random perturbations of finite size.
 
 .. note::
 
-    Just as with other PennyLane device, the number of samples taken for a circuit
-    execution can be specified using the ``shots`` keyword argument of the
-    device.
+    If you have access to an NVIDIA GPU, you can install the
+    `PennyLane-Lightning-GPU plugin <https://docs.pennylane.ai/projects/lightning/en/stable/>`_
+    and replace ``"lightning.qubit"`` by ``"lightning.gpu"`` below.
 
 Once we have a device selected, we just need a couple of other ingredients for
 the pieces of an example optimization to come together:
 
 * a circuit ansatz: :func:`~pennylane.templates.layers.StronglyEntanglingLayers`,
 * initial parameters: the correct shape can be computed by the ``shape`` method of the ansatz.
-  We also use a seed so that we can simulate the same optimization every time
-  (except for the device noise and shot noise).
+  We load a fixed set of parameters, drawn once from a normal distribution, so
+  that we can simulate the same optimization every time.
 * an observable: :math:`\bigotimes_{i=0}^{N-1}\sigma_z^i`, where :math:`N` stands
   for the number of qubits.
 * the number of layers in the ansatz and the number of wires.
@@ -170,7 +172,7 @@ from pennylane import numpy as np
 num_wires = 4
 num_layers = 5
 
-device = qml.device("qiskit.aer", wires=num_wires, shots=1000)
+device = qml.device("lightning.qubit", wires=num_wires)
 
 ansatz = qml.StronglyEntanglingLayers
 
@@ -182,12 +184,13 @@ def circuit(param):
     return qml.expval(all_pauliz_tensor_prod)
 
 
-cost_function = qml.QNode(circuit, device)
-
-np.random.seed(50)
+cost_function = qml.QNode(circuit, device, diff_method="adjoint")
 
 param_shape = ansatz.shape(num_layers, num_wires)
-init_param = np.random.normal(scale=0.1, size=param_shape, requires_grad=True)
+# Normally distributed initial parameters with a standard deviation of 0.1
+init_param = np.array(
+    np.load("../_static/demonstration_assets/spsa/init_param_simple.npy"), requires_grad=True
+)
 
 ##############################################################################
 # We will execute a few optimizations in this demo, so let's prepare a convenience
@@ -200,14 +203,11 @@ def run_optimizer(opt, cost_function, init_param, num_steps, interval, execs_per
     # Copy the initial parameters to make sure they are never overwritten
     param = init_param.copy()
 
-    # Obtain the device used in the cost function
-    dev = cost_function.device
-
     # Initialize the memory for cost values during the optimization
-    cost_history = []
+    cost_history = np.empty(num_steps + 1, requires_grad=False)
     # Monitor the initial cost value
-    cost_history.append(cost_function(param))
-    exec_history = [0]
+    cost_history[0] = cost_function(param)
+    exec_history = np.arange(num_steps + 1) * execs_per_step
 
     print(f"\nRunning the {opt.__class__.__name__} optimizer for {num_steps} iterations.")
     for step in range(num_steps):
@@ -222,8 +222,7 @@ def run_optimizer(opt, cost_function, init_param, num_steps, interval, execs_per
         param = opt.step(cost_function, param)
 
         # Monitor the cost value
-        cost_history.append(cost_function(param))
-        exec_history.append((step + 1) * execs_per_step)
+        cost_history[step + 1] = cost_function(param)
 
     print(
         f"Step {num_steps:3d}: Circuit executions: {exec_history[-1]:4d}, "
@@ -235,8 +234,9 @@ def run_optimizer(opt, cost_function, init_param, num_steps, interval, execs_per
 ##############################################################################
 # Once we have defined each piece of the optimization, there's only one
 # remaining component required: the *SPSA optimizer*.
-# We'll use the :class:`~pennylane.SPSAOptimizer` built into PennyLane,
-# for 200 iterations in total.
+# We'll build on the :class:`~pennylane.SPSAOptimizer` that comes with PennyLane,
+# using the ``BatchedSPSAOptimizer`` subclass defined below, for 200 iterations
+# in total.
 #
 # Choosing the hyperparameters
 # ^^^^^^^^^^^^^^^^^^^^^^^^^^^^
@@ -259,9 +259,148 @@ def run_optimizer(opt, cost_function, init_param, num_steps, interval, execs_per
 # using the previously mentioned guidelines. For more details, also consider the
 # `PennyLane documentation of the optimizer
 # <https://docs.pennylane.ai/en/stable/code/api/pennylane.SPSAOptimizer.html>`__
+#
+# Batching the circuit executions
+# ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+#
+# Calling the cost function twice per iteration means that every SPSA step
+# submits two separate jobs to the device. The two perturbed evaluations are
+# independent of each other, so we can instead construct both tapes and send
+# them to the device with a single ``qml.execute()`` call. On simulators and
+# hardware alike this amortizes the per-job overhead (compilation, queueing,
+# network round-trips) across the pair. We keep the update rule of the
+# ``SPSAOptimizer`` and only override how the gradient estimate is computed.
+#
+# While we are at it, we also draw the random perturbation vectors for all
+# iterations at once from a seeded random number generator, instead of drawing
+# a fresh vector at every step. This makes the SPSA runs reproducible and
+# independent of any other use of the global NumPy random state. Similarly, the
+# sequences
+#
+# .. math:: a_k = \frac{a}{(A + k)^{\alpha}}, \qquad c_k = \frac{c}{k^{\gamma}}
+#
+# only depend on the iteration number, so we compute them for all iterations
+# when the optimizer is created.
+#
+# Batching also makes it cheap to average the gradient estimate over several
+# perturbation vectors per step, as suggested in [#spall_implementation]_.
+# With :math:`q` perturbations :math:`\Delta_{k,1}, \ldots, \Delta_{k,q}`, the
+# averaged estimate
+#
+# .. math:: \hat{g}_{k}(\hat{\theta}_{k}) = \frac{1}{q}\sum_{j=1}^{q}
+#     \frac{y(\hat{\theta}_{k} +c_{k}\Delta_{k,j}) - y(\hat{\theta}_{k}
+#     -c_{k}\Delta_{k,j})}{2c_{k}\Delta_{k,j}}
+#
+# has a variance that decreases as :math:`1/q`. All :math:`2q` circuits of a
+# step are submitted together, so that simulators that execute independent
+# circuits in parallel can evaluate them at roughly the cost of a single pair.
+
+
+def get_tape(qnode, param):
+    # Given a QNode, returns a copy of the tape for the given parameters.
+    qnode.construct([param], {})
+    return qnode.tape.copy(copy_operations=True)
+
+
+def evaluate_batch(cost_function, params):
+    # Evaluates the cost function at several parameter settings with a single
+    # submission to the device.
+    tapes = [get_tape(cost_function, param) for param in params]
+    return qml.execute(tapes, cost_function.device, None)
+
+
+class BatchedSPSAOptimizer(qml.SPSAOptimizer):
+    """SPSA optimizer that executes all perturbed circuits of a step in a single batch.
+
+    Each step evaluates the cost function at ``2 * num_directions`` parameter
+    settings: one positive and one negative shift along each perturbation vector.
+
+    Args:
+        maxiter (int): the maximum number of iterations
+        num_directions (int): the number of perturbation vectors that the
+            gradient estimate is averaged over in each step
+        seed (int): seed for the random perturbation vectors
+        **kwargs: further keyword arguments passed to ``qml.SPSAOptimizer``
+    """
+
+    def __init__(self, maxiter, num_directions=1, seed=None, **kwargs):
+        super().__init__(maxiter=maxiter, **kwargs)
+        self.num_directions = num_directions
+        self.rng = np.random.default_rng(seed)
+        self.deltas = None
+        self.perturbations = None
+
+        steps = np.arange(1, maxiter + 1)
+        self.a_schedule = self.a / (self.A + steps) ** self.alpha
+        self.c_schedule = self.c / steps**self.gamma
+
+    def compute_grad(self, objective_fn, args, kwargs):
+        (param,) = args
+        if self.deltas is None:
+            # Rademacher-distributed perturbation vectors for all iterations,
+            # and the shifts c_k * delta derived from them
+            size = (self.maxiter, self.num_directions, *param.shape)
+            self.deltas = self.rng.choice([-1.0, 1.0], size=size)
+            c_k = self.c_schedule.reshape((-1,) + (1,) * (len(size) - 1))
+            self.perturbations = c_k * self.deltas
+        ck = self.c_schedule[self.k - 1]
+        deltas = self.deltas[self.k - 1]
+        perturbations = self.perturbations[self.k - 1]
+        shifted_params = [param + shift for shift in perturbations]
+        shifted_params += [param - shift for shift in perturbations]
+        results = evaluate_batch(objective_fn, shifted_params)
+        yplus, yminus = results[: self.num_directions], results[self.num_directions :]
+        # The entries of the perturbation vectors are +1 or -1, so dividing by
+        # them is the same as multiplying by them. This lets us combine all
+        # directions into the gradient estimate with a single contraction.
+        diffs = np.array([(yp - ym) / (2 * ck) for yp, ym in zip(yplus, yminus)])
+        return (np.tensordot(diffs, deltas, axes=1) / self.num_directions,)
+
+    def apply_grad(self, grad, args):
+        (param,) = args
+        return (param - self.a_schedule[self.k - 1] * grad[0],)
+
+
+##############################################################################
+# Grid search for the hyperparameters
+# ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+#
+# As mentioned above, the values of :math:`a` and :math:`c` were chosen with a
+# grid search. The optimizations for different grid points are independent of
+# each other, so we can distribute them over the available CPU cores with
+# `joblib <https://joblib.readthedocs.io/>`__. Each worker creates its own
+# device, so that no device state needs to be shared between the processes.
+# To keep things quick, we illustrate this with a coarse grid, only 50 iterations
+# per run and at most three worker processes.
+
+from joblib import Parallel, delayed
+
+
+def run_spsa_once(a, c, init_param, num_steps):
+    dev = qml.device("lightning.qubit", wires=num_wires)
+    cost = qml.QNode(circuit, dev)
+    opt = BatchedSPSAOptimizer(maxiter=num_steps, seed=50, c=c, a=a)
+    param = init_param.copy()
+    for _ in range(num_steps):
+        param = opt.step(cost, param)
+    return cost(param)
+
+
+a_grid = [0.1, 0.2, 0.4]
+c_grid = [0.05, 0.15, 0.3]
+grid = [(a, c) for a in a_grid for c in c_grid]
+final_costs = Parallel(n_jobs=3)(delayed(run_spsa_once)(a, c, init_param, 50) for a, c in grid)
+
+for (a, c), final_cost in zip(grid, final_costs):
+    print(f"a = {a:.2f}, c = {c:.2f}: Cost after 50 iterations = {final_cost:.6f}")
+
+##############################################################################
+# Such short runs only give a rough picture of how the hyperparameters behave.
+# For the optimization below, we use the values :math:`a=0.2` and
+# :math:`c=0.15` from our full grid search.
 
 num_steps_spsa = 200
-opt = qml.SPSAOptimizer(maxiter=num_steps_spsa, c=0.15, a=0.2)
+opt = BatchedSPSAOptimizer(maxiter=num_steps_spsa, seed=50, c=0.15, a=0.2)
 # We spend 2 circuit evaluations per step:
 execs_per_step = 2
 cost_history_spsa, exec_history_spsa = run_optimizer(
@@ -272,10 +411,18 @@ cost_history_spsa, exec_history_spsa = run_optimizer(
 # Now let's perform the same optimization using gradient descent. We set the
 # step size according to a favourable value found after grid search for fast
 # convergence.
+#
+# As we are working with a state-vector simulator, we created the QNode with
+# ``diff_method="adjoint"``. The adjoint method computes the full gradient from a
+# single forward and backward pass through the circuit, which makes the
+# simulation much faster than the parameter-shift rule. On hardware, however,
+# the parameter-shift rule would be used, and it is the number of circuits
+# executed there that we are interested in. We therefore keep counting the
+# circuit executions that the parameter-shift rule requires.
 
 num_steps_grad = 15
 opt = qml.GradientDescentOptimizer(stepsize=0.3)
-# We spend 2 circuit evaluations per parameter per step:
+# On hardware, we spend 2 circuit evaluations per parameter per step:
 execs_per_step = 2 * np.prod(param_shape)
 cost_history_grad, exec_history_grad = run_optimizer(
     opt, cost_function, init_param, num_steps_grad, 3, execs_per_step
@@ -309,8 +456,19 @@ plt.show()
 # Let's take a deeper dive to see how much better it actually is by computing
 # the ratio of required circuit executions to reach an absolute accuracy of 0.01.
 #
-grad_execs_to_prec = exec_history_grad[np.where(np.array(cost_history_grad) < -0.99)[0][0]]
-spsa_execs_to_prec = exec_history_spsa[np.where(np.array(cost_history_spsa) < -0.99)[0][0]]
+
+
+def execs_to_precision(cost_history, exec_history, threshold=-0.99):
+    # Returns the number of circuit executions after which the cost first
+    # dropped below the threshold
+    reached = np.asarray(cost_history) < threshold
+    if not reached.any():
+        raise ValueError(f"The cost never dropped below {threshold}.")
+    return exec_history[int(np.argmax(reached))]
+
+
+grad_execs_to_prec = execs_to_precision(cost_history_grad, exec_history_grad)
+spsa_execs_to_prec = execs_to_precision(cost_history_spsa, exec_history_spsa)
 print(f"Circuit execution ratio: {np.round(grad_execs_to_prec/spsa_execs_to_prec, 3)}.")
 
 ##############################################################################
@@ -318,6 +476,102 @@ print(f"Circuit execution ratio: {np.round(grad_execs_to_prec/spsa_execs_to_prec
 # using multiple times fewer circuit executions than gradient descent! That's an important
 # saving, especially when running the algorithm on actual quantum hardware.
 #
+# Averaging over several perturbations
+# ^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+#
+# Let's also try out the averaged gradient estimate with :math:`q=4`
+# perturbation vectors per step. This spends :math:`2q=8` circuit executions
+# per step, but all of them are submitted in a single batch.
+
+opt = BatchedSPSAOptimizer(maxiter=num_steps_spsa, num_directions=4, seed=50, c=0.15, a=0.2)
+# We spend 2 circuit evaluations per perturbation vector per step:
+execs_per_step = 2 * 4
+cost_history_avg, exec_history_avg = run_optimizer(
+    opt, cost_function, init_param, num_steps_spsa, 20, execs_per_step
+)
+
+##############################################################################
+# Let's compare both SPSA runs, once per iteration and once per circuit
+# execution.
+
+fig, axes = plt.subplots(1, 2, figsize=(14, 6))
+
+axes[0].plot(cost_history_spsa, label="SPSA, $q=1$")
+axes[0].plot(cost_history_avg, label="SPSA, $q=4$")
+axes[0].set_xlabel("Iterations", fontsize=14)
+
+axes[1].plot(exec_history_spsa, cost_history_spsa, label="SPSA, $q=1$")
+axes[1].plot(exec_history_avg, cost_history_avg, label="SPSA, $q=4$")
+axes[1].set_xlabel("Circuit executions", fontsize=14)
+
+for ax in axes:
+    ax.set_ylabel("Cost function value", fontsize=14)
+    ax.grid()
+    ax.legend(fontsize=14)
+
+fig.suptitle("SPSA with a single and with averaged gradient estimates", fontsize=16)
+plt.show()
+
+##############################################################################
+# Averaging reduces the variance of every gradient estimate, so per iteration
+# the averaged run is expected to progress at least as steadily. Per circuit
+# execution, however, it pays four times as much for each step. Whether this
+# trade-off pays off depends on how much the device benefits from receiving
+# the circuits in batches.
+#
+# SPSA as a gradient transform
+# ^^^^^^^^^^^^^^^^^^^^^^^^^^^^
+#
+# PennyLane also provides the SPSA gradient estimate as the gradient transform
+# :func:`~pennylane.gradients.spsa_grad`. Using it as the differentiation
+# method of a QNode, any PennyLane optimizer can be run with SPSA gradient
+# estimates, and the perturbed circuits of every estimate are again executed
+# as a single batch. In contrast to the ``SPSAOptimizer``, the perturbation
+# size ``h`` and the step size stay constant during the optimization, so we
+# choose a smaller step size. We pass a random number generator rather than a
+# seed, because a seed would be used to create a fresh generator for every
+# gradient, so the same perturbation direction would be drawn in every step.
+
+cost_function_spsa_grad = qml.QNode(
+    circuit,
+    device,
+    diff_method=qml.gradients.spsa_grad,
+    h=0.15,
+    num_directions=1,
+    sampler_rng=np.random.default_rng(50),
+)
+opt = qml.GradientDescentOptimizer(stepsize=0.03)
+# Differentiating the QNode executes the unshifted circuit, followed by the 2
+# perturbed circuits of the SPSA gradient estimate, so we spend 3 circuit
+# evaluations per step:
+execs_per_step = 3
+cost_history_transform, exec_history_transform = run_optimizer(
+    opt, cost_function_spsa_grad, init_param, num_steps_spsa, 20, execs_per_step
+)
+
+##############################################################################
+# Let's add this run to our comparison of the optimizers for the simple task.
+
+plt.figure(figsize=(10, 6))
+
+plt.plot(exec_history_grad, cost_history_grad, label="Gradient descent")
+plt.plot(exec_history_spsa, cost_history_spsa, label="SPSA")
+plt.plot(exec_history_transform, cost_history_transform, label="Gradient descent with spsa_grad")
+
+plt.xlabel("Circuit executions", fontsize=14)
+plt.ylabel("Cost function value", fontsize=14)
+plt.grid()
+
+plt.title("Gradient descent vs. SPSA for simple optimization", fontsize=16)
+plt.legend(fontsize=14)
+plt.show()
+
+##############################################################################
+# The gradient transform makes it easy to combine SPSA gradient estimates with
+# other optimizers, and to compare them with other differentiation methods on
+# an equal footing. Note that it spends one additional circuit execution per
+# step on the unshifted cost, which the ``SPSAOptimizer`` does not need.
+#
 # SPSA and the variational quantum eigensolver
 # --------------------------------------------
 #
@@ -331,13 +585,25 @@ print(f"Circuit execution ratio: {np.round(grad_execs_to_prec/spsa_execs_to_prec
 # The :math:`H_2` Hamiltonian uses 4 qubits, contains 15 terms, and has a ground
 # state energy of :math:`-1.136189454088` Hartree.
 #
+# Measuring each of the 15 terms with a separate circuit would be wasteful.
+# Terms that commute qubit-wise, i.e., that act with the same Pauli operator
+# or the identity on every qubit, can be estimated from the measurement outcomes
+# of a single circuit. We therefore let PennyLane split the terms into groups
+# of qubit-wise commuting operators when creating the Hamiltonian.
+#
 
 from pennylane import qchem
 
 symbols = ["H", "H"]
 coordinates = np.array([0.0, 0.0, -0.6614, 0.0, 0.0, 0.6614])
 h2_ham, num_qubits = qchem.molecular_hamiltonian(symbols, coordinates)
-h2_ham = qml.Hamiltonian(qml.math.real(h2_ham.coeffs), h2_ham.ops)
+# Group the Hamiltonian terms into qubit-wise commuting sets, so that all terms
+# of a group are estimated from the same circuit execution
+h2_ham = qml.Hamiltonian(
+    np.asarray(h2_ham.coeffs).real, h2_ham.ops, grouping_type="qwc", method="rlf"
+)
+num_groups = len(h2_ham.grouping_indices)
+print(f"The {len(h2_ham.ops)} Hamiltonian terms form {num_groups} qubit-wise commuting groups.")
 
 true_energy = -1.136189454088
 
@@ -358,7 +624,16 @@ def ansatz(param, wires):
 #
 # Since SPSA is robust to noise, let's see how it fares compared to gradient
 # descent when run on noisy hardware. For this, we will set up and use a simulated
-# version of IBM Q's hardware.
+# version of IBM Q's hardware. We'll be using a device from the `PennyLane-Qiskit
+# plugin <https://pennylaneqiskit.readthedocs.io/en/latest/>`_ that samples quantum
+# circuits to get measurement outcomes and later post-processes these outcomes to
+# compute statistics like expectation values.
+#
+# .. note::
+#
+#     Just as with other PennyLane devices, the number of samples taken for a circuit
+#     execution can be specified using the ``shots`` keyword argument of the
+#     device.
 #
 
 # Note: you will need to be authenticated to IBMQ to run the following (commented) code.
@@ -374,10 +649,18 @@ def ansatz(param, wires):
 from qiskit.providers.aer import noise
 from qiskit.providers.fake_provider import FakeLima
 
-# Load a fake backed to create a noise model, and create a device using that model
+# Load a fake backed to create a noise model, and create a device using that model.
+# All options are set when the Aer backend of the device is created; this single
+# backend then executes all circuits of this section, running the circuits of a
+# batch in parallel.
 noise_model = noise.NoiseModel.from_backend(FakeLima())
 noisy_device = qml.device(
-    "qiskit.aer", wires=num_qubits, shots=1000, noise_model=noise_model
+    "qiskit.aer",
+    wires=num_qubits,
+    shots=1000,
+    noise_model=noise_model,
+    max_parallel_experiments=0,
+    max_parallel_threads=0,
 )
 
 
@@ -388,18 +671,19 @@ def circuit(param):
 
 cost_function = qml.QNode(circuit, noisy_device)
 
-# This random seed was used in the original VQE demo and is known to allow the
-# gradient descent algorithm to converge to the global minimum.
-np.random.seed(0)
+# These initial parameters were drawn with the random seed used in the original
+# VQE demo and are known to allow the gradient descent algorithm to converge to
+# the global minimum.
 param_shape = (2, num_qubits, 3)
-init_param = np.random.normal(0, np.pi, param_shape, requires_grad=True)
+init_param = np.array(
+    np.load("../_static/demonstration_assets/spsa/init_param_h2.npy"), requires_grad=True
+)
 
 # Initialize the optimizer - optimal step size was found through a grid search
 opt = qml.GradientDescentOptimizer(stepsize=2.2)
 
-# We spend 2 * 15 circuit evaluations per parameter per step, as there are
-# 15 Hamiltonian terms
-execs_per_step = 2 * 15 * np.prod(param_shape)
+# We spend 2 circuit evaluations per measurement group per parameter per step
+execs_per_step = 2 * num_groups * np.prod(param_shape)
 # Run the optimization
 cost_history_grad, exec_history_grad = run_optimizer(
     opt, cost_function, init_param, num_steps_grad, 3, execs_per_step
@@ -445,16 +729,16 @@ plt.show()
 # ^^^^^^^^^^^^^
 #
 # Now let's perform the same experiment using SPSA for the VQE optimization.
-# SPSA should use only 2 circuit executions per term in the expectation value.
-# Since there are 15 terms and we choose 160 iterations with two evaluations for
-# each gradient estimate, we expect 4800 total device
+# SPSA should use only 2 circuit executions per measurement group of the
+# Hamiltonian. Since there are 5 groups and we choose 160 iterations with two
+# evaluations for each gradient estimate, we expect 1600 total device
 # executions.
 
 num_steps_spsa = 160
-opt = qml.SPSAOptimizer(maxiter=num_steps_spsa, c=0.3, a=1.5)
+opt = BatchedSPSAOptimizer(maxiter=num_steps_spsa, seed=0, c=0.3, a=1.5)
 
-# We spend 2 * 15 circuit evaluations per step, as there are 15 Hamiltonian terms
-execs_per_step = 2 * 15
+# We spend 2 circuit evaluations per measurement group per step
+execs_per_step = 2 * num_groups
 # Run the optimization
 cost_history_spsa, exec_history_spsa = run_optimizer(
     opt, cost_function, init_param, num_steps_spsa, 20, execs_per_step